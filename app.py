@@ -13,6 +13,11 @@ from prophet import Prophet
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
+import time
+from contextlib import contextmanager
+
+# Start of this script run, for the ?timings=1 rerun report
+PAGE_START = time.perf_counter()
 
 # --- Streamlit Style Setup ---
 st.markdown(
@@ -119,6 +124,9 @@ st.markdown('<div class="header">Ventory</div>', unsafe_allow_html=True)
 st.markdown('<div class="subheader">Your sales and inventory partner</div>', unsafe_allow_html=True)
 
 # --- Data Processing ---
+# Ventory stays on in-memory pandas: it accepts Excel uploads, which DuckDB cannot
+# read without an extra extension, and it has no heatmap over the full history.
+# Large histories belong in etsy_forecast.py, which has the DuckDB backend.
 def load_data(uploaded_file):
     try:
         if uploaded_file.type == "text/csv":
@@ -149,7 +157,7 @@ def create_forecast_chart(actual_df, forecast_df):
     today_timestamp = datetime.now().timestamp() * 1000
     
     # Actual sales
-       fig.add_trace(go.Scatter(
+    fig.add_trace(go.Scatter(
         x=actual_df['date'],
         y=actual_df['units_sold'],
         mode='markers+lines',
@@ -206,7 +214,10 @@ def create_forecast_chart(actual_df, forecast_df):
     return fig
 
 # --- Forecasting Logic ---
-def run_forecast(product_df, current_stock, safety_stock, lead_time):
+# Fitting Prophet is by far the slowest step, so it is cached per product series
+# and kept separate from anything that depends on the stock inputs or today's date.
+@st.cache_data(show_spinner="Fitting forecast...", max_entries=20, ttl="1d")
+def fit_forecast(product_df):
     model = Prophet(weekly_seasonality=True, daily_seasonality=False)
     model.fit(product_df.rename(columns={'date':'ds', 'units_sold':'y'}))
     future = model.make_future_dataframe(periods=180)
@@ -219,17 +230,23 @@ def run_forecast(product_df, current_stock, safety_stock, lead_time):
     # Forecast stats
     forecast_avg = forecast['yhat'].mean()
     forecast_std = forecast['yhat'].std()
-    next_30_days = forecast[forecast['ds'] <= (datetime.now() + timedelta(days=30))]['yhat'].mean()
-    
-    reorder_point = (forecast_avg * lead_time) + safety_stock
-    days_remaining = max(0, (current_stock - reorder_point) / forecast_avg) if forecast_avg > 0 else 0
     
     return {
         'forecast': forecast,
         'hist_avg': round(hist_avg, 1),
         'hist_std': round(hist_std, 1),
         'forecast_avg': round(forecast_avg, 1),
-        'forecast_std': round(forecast_std, 1),
+        'forecast_std': round(forecast_std, 1)
+    }
+
+def plan_inventory(results, current_stock, safety_stock, lead_time):
+    forecast = results['forecast']
+    forecast_avg = forecast['yhat'].mean()
+    next_30_days = forecast[forecast['ds'] <= (datetime.now() + timedelta(days=30))]['yhat'].mean()
+    reorder_point = (forecast_avg * lead_time) + safety_stock
+    days_remaining = max(0, (current_stock - reorder_point) / forecast_avg) if forecast_avg > 0 else 0
+    
+    return {
         'next_30_days': round(next_30_days, 1),
         'reorder_point': round(reorder_point),
         'days_remaining': days_remaining,
@@ -237,6 +254,117 @@ def run_forecast(product_df, current_stock, safety_stock, lead_time):
         'stockout_date': (datetime.now() + timedelta(days=current_stock/forecast_avg)).strftime('%b %d')
     }
 
+# --- Rerun Timings ---
+# Open the app with ?timings=1 to print how long each section took to render.
+# A widget inside a fragment only pays for its own section's line. "Full page"
+# covers a whole script run (page load or new upload); once a product's forecast
+# is cached it no longer includes the Prophet fit.
+SHOW_TIMINGS = st.query_params.get("timings") == "1"
+
+@contextmanager
+def timed(label):
+    start = time.perf_counter()
+    yield
+    if SHOW_TIMINGS:
+        st.caption(f"⏱️ {label}: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+# --- Page Sections ---
+# Each section is a fragment: a widget inside it only reruns that section.
+# Dependencies flow top-down through the arguments:
+#   upload (full rerun) -> product analysis -> inventory status
+@st.fragment
+def product_analysis_section(df):
+    with timed("Product analysis"):
+        st.markdown('<div class="product-select">', unsafe_allow_html=True)
+        product = st.selectbox("SELECT PRODUCT FOR ANALYSIS", df['product'].unique())
+        st.markdown('</div>', unsafe_allow_html=True)
+        
+        product_df = df[df['product'] == product]
+        
+        # Run forecast
+        results = fit_forecast(product_df)
+        
+        # --- Metrics Dashboard ---
+        st.subheader("📊 Sales Performance")
+        m1, m2, m3, m4 = st.columns(4)
+        
+        # Historical Daily
+        m1.markdown(f"""
+        <div class="metric-box">
+            <h3>Historical Daily Average</h3>
+            <h2>{results['hist_avg']} units</h2>
+            <div class="variation">± {results['hist_std']} units variation</div>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Historical Monthly
+        m2.markdown(f"""
+        <div class="metric-box">
+            <h3>Historical Monthly Average</h3>
+            <h2>{round(results['hist_avg'] * 30)} units</h2>
+            <div class="variation">± {round(results['hist_std'] * 30)} units variation</div>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Projected Daily
+        m3.markdown(f"""
+        <div class="metric-box">
+            <h3>Projected Daily Average</h3>
+            <h2>{results['forecast_avg']} units</h2>
+            <div class="variation">± {results['forecast_std']} units expected</div>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Projected Monthly
+        m4.markdown(f"""
+        <div class="metric-box">
+            <h3>Projected Monthly Average</h3>
+            <h2>{round(results['forecast_avg'] * 30)} units</h2>
+            <div class="variation">± {round(results['forecast_std'] * 30)} units expected</div>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # --- Forecast Visualization ---
+        st.plotly_chart(
+            create_forecast_chart(product_df, results['forecast']),
+            use_container_width=True
+        )
+        
+        inventory_status_section(results)
+
+@st.fragment
+def inventory_status_section(results):
+    with timed("Inventory status"):
+        st.subheader("🛍️ Inventory Status")
+        
+        # Inventory controls
+        with st.expander("⚙️ INVENTORY SETTINGS", expanded=True):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                current_stock = st.number_input("CURRENT STOCK (UNITS)", min_value=0, value=500)
+            with col2:
+                safety_stock = st.number_input("SAFETY STOCK (UNITS)", min_value=0, value=20)
+            with col3:
+                lead_time = st.number_input("LEAD TIME (DAYS)", min_value=1, value=7)
+        
+        plan = plan_inventory(results, current_stock, safety_stock, lead_time)
+        
+        # --- Inventory Alerts ---
+        if current_stock <= plan['reorder_point']:
+            st.error(f"""
+            🚨 **URGENT REORDER NEEDED**  
+            - Suggested Quantity: **{plan['order_qty']} units**  
+            - Stockout in: **~{plan['days_remaining']:.0f} days**  
+            - Projected Stockout Date: **{plan['stockout_date']}**
+            """)
+        else:
+            st.success(f"""
+            ✅ **INVENTORY HEALTHY**  
+            - Reorder Point: **{plan['reorder_point']} units**  
+            - Current Stock Lasts: **{plan['days_remaining'] + lead_time:.0f} days**  
+            - Suggested Order Date: **{(datetime.now() + timedelta(days=plan['days_remaining'])).strftime('%b %d')}**
+            """)
+
 # --- Main App ---
 uploaded_file = st.file_uploader("", type=["csv", "xlsx"], key="file_uploader")
 
@@ -248,88 +376,7 @@ if uploaded_file is not None:
     with st.expander("👀 View Uploaded Data"):
         st.write(df.head())
     
-    # --- Product Selection ---
-    st.markdown('<div class="product-select">', unsafe_allow_html=True)
-    product = st.selectbox("SELECT PRODUCT FOR ANALYSIS", df['product'].unique())
-    st.markdown('</div>', unsafe_allow_html=True)
-    
-    product_df = df[df['product'] == product]
-    
-    # Inventory controls
-    with st.expander("⚙️ INVENTORY SETTINGS", expanded=True):
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            current_stock = st.number_input("CURRENT STOCK (UNITS)", min_value=0, value=500)
-        with col2:
-            safety_stock = st.number_input("SAFETY STOCK (UNITS)", min_value=0, value=20)
-        with col3:
-            lead_time = st.number_input("LEAD TIME (DAYS)", min_value=1, value=7)
-    
-    # Run forecast
-    results = run_forecast(product_df, current_stock, safety_stock, lead_time)
-    
-    # --- Metrics Dashboard ---
-    st.subheader("📊 Sales Performance")
-    m1, m2, m3, m4 = st.columns(4)
-    
-    # Historical Daily
-    m1.markdown(f"""
-    <div class="metric-box">
-        <h3>Historical Daily Average</h3>
-        <h2>{results['hist_avg']} units</h2>
-        <div class="variation">± {results['hist_std']} units variation</div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Historical Monthly
-    m2.markdown(f"""
-    <div class="metric-box">
-        <h3>Historical Monthly Average</h3>
-        <h2>{round(results['hist_avg'] * 30)} units</h2>
-        <div class="variation">± {round(results['hist_std'] * 30)} units variation</div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Projected Daily
-    m3.markdown(f"""
-    <div class="metric-box">
-        <h3>Projected Daily Average</h3>
-        <h2>{results['forecast_avg']} units</h2>
-        <div class="variation">± {results['forecast_std']} units expected</div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Projected Monthly
-    m4.markdown(f"""
-    <div class="metric-box">
-        <h3>Projected Monthly Average</h3>
-        <h2>{round(results['forecast_avg'] * 30)} units</h2>
-        <div class="variation">± {round(results['forecast_std'] * 30)} units expected</div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # --- Forecast Visualization ---
-    st.plotly_chart(
-        create_forecast_chart(product_df, results['forecast']),
-        use_container_width=True
-    )
-    
-    # --- Inventory Alerts ---
-    st.subheader("🛍️ Inventory Status")
-    if current_stock <= results['reorder_point']:
-        st.error(f"""
-        🚨 **URGENT REORDER NEEDED**  
-        - Suggested Quantity: **{results['order_qty']} units**  
-        - Stockout in: **~{results['days_remaining']:.0f} days**  
-        - Projected Stockout Date: **{results['stockout_date']}**
-        """)
-    else:
-        st.success(f"""
-        ✅ **INVENTORY HEALTHY**  
-        - Reorder Point: **{results['reorder_point']} units**  
-        - Current Stock Lasts: **{results['days_remaining'] + lead_time:.0f} days**  
-        - Suggested Order Date: **{(datetime.now() + timedelta(days=results['days_remaining'])).strftime('%b %d')}**
-        """)
+    product_analysis_section(df)
 
 else:
     st.info("ℹ️ Please upload a CSV or Excel file with sales data")
@@ -358,3 +405,6 @@ st.markdown(
     </div>
     """, unsafe_allow_html=True
 )
+
+if SHOW_TIMINGS:
+    st.caption(f"⏱️ Full page: {(time.perf_counter() - PAGE_START) * 1000:.0f} ms")
@@ -13,6 +13,20 @@ from prophet import Prophet
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Optional columnar backend - falls back to in-memory pandas when missing
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Start of this script run, for the ?timings=1 rerun report
+PAGE_START = time.perf_counter()
 
 # --- Streamlit Style Setup ---
 st.markdown("""
@@ -49,12 +63,16 @@ st.markdown("""
 st.title("📊 Professional Inventory Dashboard")
 
 # --- Data Processing ---
+def detect_columns(columns):
+    date_col = next((col for col in columns if 'date' in col.lower()), 'date')
+    sales_col = next((col for col in columns if any(x in col.lower() for x in ['units', 'sales', 'qty'])), 'units_sold')
+    product_col = next((col for col in columns if 'product' in col.lower()), 'product')
+    return date_col, sales_col, product_col
+
 def load_data(uploaded_file):
     try:
         df = pd.read_csv(uploaded_file)
-        date_col = next((col for col in df.columns if 'date' in col.lower()), 'date')
-        sales_col = next((col for col in df.columns if any(x in col.lower() for x in ['units', 'sales', 'qty'])), 'units_sold')
-        product_col = next((col for col in df.columns if 'product' in col.lower()), 'product')
+        date_col, sales_col, product_col = detect_columns(df.columns)
         
         df = df.rename(columns={
             date_col: 'date',
@@ -67,13 +85,193 @@ def load_data(uploaded_file):
         st.error(f"❌ Data Error: {str(e)}")
         st.stop()
 
+# --- Columnar Query Backend ---
+# With DuckDB installed the sales CSV is converted once to Parquet on disk and every
+# aggregate below is pushed down as SQL, so only the (small) results reach pandas.
+# Without it, the same functions run against the in-memory DataFrame instead.
+#
+# Uploads are still held in server memory while they arrive and are capped by
+# server.maxUploadSize (200 MB by default). Set SALES_DATA_PATH to a CSV on disk
+# to skip the upload entirely; with DuckDB that file is never loaded into Python.
+SALES_DATA_PATH = os.environ.get("SALES_DATA_PATH")
+
+def _quote_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _quote_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+# units_sold is stored as BIGINT or DOUBLE, matching what pandas would infer
+INTEGER_TYPES = ('TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'UTINYINT', 'USMALLINT', 'UINTEGER')
+
+# Every ingest writes a new Parquet file that is never modified afterwards, so a
+# result keyed on (path, sql, params) stays valid and repeat scans are skipped.
+@st.cache_data(show_spinner=False, max_entries=200)
+def query(parquet_path, sql, params=None):
+    con = duckdb.connect()
+    try:
+        sales = f"read_parquet({_quote_literal(parquet_path)})"
+        if '{units_type}' in sql:
+            # SUM over BIGINT returns HUGEINT, which pandas reads as float64
+            units_type = con.execute(f"DESCRIBE SELECT units_sold FROM {sales}").fetchone()[1]
+            sql = sql.replace('{units_type}', units_type)
+        sql = sql.replace('{sales}', sales)
+        return con.execute(sql, params or []).df()
+    finally:
+        con.close()
+
+def _remove_workdir(parquet_path):
+    shutil.rmtree(os.path.dirname(parquet_path), ignore_errors=True)
+
+def _parquet_exists(parquet_path):
+    return os.path.exists(parquet_path)
+
+def _write_parquet(csv_path, parquet_path):
+    con = duckdb.connect()
+    try:
+        source = f"read_csv_auto({_quote_literal(csv_path)})"
+        schema = con.execute(f"DESCRIBE SELECT * FROM {source}").df()
+        date_col, sales_col, product_col = detect_columns(schema['column_name'].tolist())
+        sales_type = schema.loc[schema['column_name'] == sales_col, 'column_type'].iloc[0]
+        units_type = 'BIGINT' if sales_type in INTEGER_TYPES else 'DOUBLE'
+        con.execute(f"""
+            COPY (
+                SELECT
+                    CAST({_quote_ident(date_col)} AS TIMESTAMP) AS date,
+                    CAST({_quote_ident(sales_col)} AS {units_type}) AS units_sold,
+                    CAST({_quote_ident(product_col)} AS VARCHAR) AS product
+                FROM {source}
+                ORDER BY date
+            ) TO {_quote_literal(parquet_path)} (FORMAT PARQUET)
+        """)
+    finally:
+        con.close()
+
+# Each upload gets its own temp dir holding a full-size Parquet copy. The cache is
+# per session and keeps only the latest upload; replaced, expired and disconnected
+# entries delete their dir through on_release.
+@st.cache_resource(
+    show_spinner="Indexing sales history...",
+    scope="session",
+    max_entries=1,
+    ttl="6h",
+    validate=_parquet_exists,
+    on_release=_remove_workdir
+)
+def ingest_to_parquet(file_id, _uploaded_file):
+    workdir = tempfile.mkdtemp(prefix="etsy_forecast_")
+    csv_path = os.path.join(workdir, "upload.csv")
+    parquet_path = os.path.join(workdir, "sales.parquet")
+    try:
+        _uploaded_file.seek(0)
+        with open(csv_path, "wb") as out:
+            shutil.copyfileobj(_uploaded_file, out)
+        _write_parquet(csv_path, parquet_path)
+        return parquet_path
+    except Exception as e:
+        shutil.rmtree(workdir, ignore_errors=True)
+        st.error(f"❌ Data Error: {str(e)}")
+        st.stop()
+    finally:
+        if os.path.exists(csv_path):
+            os.remove(csv_path)
+
+# A CSV on disk is shared by every session, so it is indexed once globally and
+# re-indexed (replacing the old copy) only when the file changes.
+@st.cache_resource(
+    show_spinner="Indexing sales history...",
+    max_entries=1,
+    validate=_parquet_exists,
+    on_release=_remove_workdir
+)
+def ingest_path(csv_path, modified):
+    workdir = tempfile.mkdtemp(prefix="etsy_forecast_")
+    parquet_path = os.path.join(workdir, "sales.parquet")
+    try:
+        _write_parquet(csv_path, parquet_path)
+        return parquet_path
+    except Exception as e:
+        shutil.rmtree(workdir, ignore_errors=True)
+        st.error(f"❌ Data Error: {str(e)}")
+        st.stop()
+
+def load_source(sales_file):
+    if duckdb is None:
+        return load_data(sales_file)
+    if isinstance(sales_file, str):
+        modified = os.path.getmtime(sales_file) if os.path.exists(sales_file) else None
+        return ingest_path(sales_file, modified)
+    return ingest_to_parquet(sales_file.file_id, sales_file)
+
+def require_source(source):
+    # Fragments keep the source from the session's last full run. If that Parquet
+    # file has since been released (e.g. another session re-indexed a changed
+    # SALES_DATA_PATH), a full rerun picks up the current one.
+    if isinstance(source, str) and not _parquet_exists(source):
+        st.rerun()
+
+def product_list(source):
+    if isinstance(source, pd.DataFrame):
+        return source['product'].unique()
+    return query(source, """
+        SELECT product, MIN(date) AS first_sale
+        FROM {sales}
+        GROUP BY product
+        ORDER BY first_sale
+    """)['product'].tolist()
+
+def product_month_totals(source):
+    if isinstance(source, pd.DataFrame):
+        monthly_sales = source.copy()
+        monthly_sales['month'] = monthly_sales['date'].dt.to_period('M').astype(str)
+        return monthly_sales.groupby(['product', 'month'])['units_sold'].sum().reset_index()
+    return query(source, """
+        SELECT product, strftime(date, '%Y-%m') AS month, CAST(SUM(units_sold) AS {units_type}) AS units_sold
+        FROM {sales}
+        GROUP BY product, month
+        ORDER BY product, month
+    """)
+
+def product_daily_series(source, product):
+    if isinstance(source, pd.DataFrame):
+        product_df = source[source['product'] == product]
+        return (product_df.groupby(product_df['date'].dt.floor('D'))['units_sold']
+                .sum().reset_index())
+    return query(source, """
+        SELECT date_trunc('day', date) AS date, CAST(SUM(units_sold) AS {units_type}) AS units_sold
+        FROM {sales}
+        WHERE product = ?
+        GROUP BY 1
+        ORDER BY 1
+    """, [product])
+
+def product_rollup(source, product, freq):
+    # freq: 'week' or 'month'
+    if isinstance(source, pd.DataFrame):
+        product_df = source[source['product'] == product]
+        period = product_df['date'].dt.to_period('W' if freq == 'week' else 'M').dt.start_time
+        return product_df.groupby(period)['units_sold'].sum().rename_axis('date').reset_index()
+    return query(source, """
+        SELECT date_trunc(?, date) AS date, CAST(SUM(units_sold) AS {units_type}) AS units_sold
+        FROM {sales}
+        WHERE product = ?
+        GROUP BY 1
+        ORDER BY 1
+    """, [freq, product])
+
+def product_stats(source, product):
+    if isinstance(source, pd.DataFrame):
+        units = source.loc[source['product'] == product, 'units_sold']
+        return {'hist_avg': units.mean(), 'hist_std': units.std()}
+    stats = query(source, """
+        SELECT AVG(units_sold) AS hist_avg, STDDEV_SAMP(units_sold) AS hist_std
+        FROM {sales}
+        WHERE product = ?
+    """, [product])
+    return stats.iloc[0].to_dict()
+
 # --- Tile Heatmap Visualization ---
-def create_tile_heatmap(df):
-    # Prepare monthly sales data
-    monthly_sales = df.copy()
-    monthly_sales['month'] = monthly_sales['date'].dt.to_period('M').astype(str)
-    heatmap_data = monthly_sales.groupby(['product', 'month'])['units_sold'].sum().reset_index()
-    
+def create_tile_heatmap(heatmap_data):
     # Create tile heatmap with red-to-green color scale
     fig = px.scatter(
         heatmap_data,
@@ -174,30 +372,39 @@ def create_forecast_chart(actual_df, forecast_df):
     return fig
 
 # --- Forecasting Logic ---
-def run_forecast(product_df, current_stock, safety_stock, lead_time):
+# Fitting Prophet is by far the slowest step, so it is cached per product series
+# and kept separate from anything that depends on the stock inputs or today's date.
+@st.cache_data(show_spinner="Fitting forecast...", max_entries=20, ttl="1d")
+def fit_forecast(product_df, hist_stats):
     model = Prophet(weekly_seasonality=True, daily_seasonality=False)
     model.fit(product_df.rename(columns={'date':'ds', 'units_sold':'y'}))
     future = model.make_future_dataframe(periods=180)
     forecast = model.predict(future)
     
     # Historical stats
-    hist_avg = product_df['units_sold'].mean()
-    hist_std = product_df['units_sold'].std()
+    hist_avg = hist_stats['hist_avg']
+    hist_std = hist_stats['hist_std']
     
     # Forecast stats
     forecast_avg = forecast['yhat'].mean()
     forecast_std = forecast['yhat'].std()
-    next_30_days = forecast[forecast['ds'] <= (datetime.now() + timedelta(days=30))]['yhat'].mean()
-    
-    reorder_point = (forecast_avg * lead_time) + safety_stock
-    days_remaining = max(0, (current_stock - reorder_point) / forecast_avg) if forecast_avg > 0 else 0
     
     return {
         'forecast': forecast,
         'hist_avg': round(hist_avg, 1),
         'hist_std': round(hist_std, 1),
         'forecast_avg': round(forecast_avg, 1),
-        'forecast_std': round(forecast_std, 1),
+        'forecast_std': round(forecast_std, 1)
+    }
+
+def plan_inventory(results, current_stock, safety_stock, lead_time):
+    forecast = results['forecast']
+    forecast_avg = forecast['yhat'].mean()
+    next_30_days = forecast[forecast['ds'] <= (datetime.now() + timedelta(days=30))]['yhat'].mean()
+    reorder_point = (forecast_avg * lead_time) + safety_stock
+    days_remaining = max(0, (current_stock - reorder_point) / forecast_avg) if forecast_avg > 0 else 0
+    
+    return {
         'next_30_days': round(next_30_days, 1),
         'reorder_point': round(reorder_point),
         'days_remaining': days_remaining,
@@ -205,101 +412,153 @@ def run_forecast(product_df, current_stock, safety_stock, lead_time):
         'stockout_date': (datetime.now() + timedelta(days=current_stock/forecast_avg)).strftime('%b %d')
     }
 
+# --- Rerun Timings ---
+# Open the app with ?timings=1 to print how long each section took to render.
+# A widget inside a fragment only pays for its own section's line. "Full page"
+# covers a whole script run (page load or new upload); once a product's forecast
+# is cached it no longer includes the Prophet fit.
+SHOW_TIMINGS = st.query_params.get("timings") == "1"
+
+@contextmanager
+def timed(label):
+    start = time.perf_counter()
+    yield
+    if SHOW_TIMINGS:
+        st.caption(f"⏱️ {label}: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+# --- Page Sections ---
+# Each section is a fragment: a widget inside it only reruns that section.
+# Dependencies flow top-down through the arguments:
+#   upload (full rerun) -> heatmap
+#                       -> product analysis -> sales rollup
+#                                           -> inventory status
+@st.fragment
+def heatmap_section(source):
+    with timed("Heatmap"):
+        st.subheader("🧱 Sales Volume Heatmap")
+        st.markdown("""
+        <div style="margin-bottom: 20px;">
+            <small>Tile size and color represent sales volume (larger/green = better sales)</small>
+        </div>
+        """, unsafe_allow_html=True)
+        heatmap_fig = create_tile_heatmap(product_month_totals(source))
+        st.plotly_chart(heatmap_fig, use_container_width=True)
+
+@st.fragment
+def rollup_section(source, product):
+    require_source(source)
+    with timed("Sales rollup"):
+        with st.expander("📅 VIEW SALES ROLLUP"):
+            freq = st.radio("GROUP BY", ['week', 'month'], horizontal=True, format_func=str.upper)
+            rollup_df = product_rollup(source, product, freq)
+            st.bar_chart(rollup_df, x='date', y='units_sold')
+
+@st.fragment
+def product_analysis_section(source):
+    require_source(source)
+    with timed("Product analysis"):
+        product = st.selectbox("SELECT PRODUCT FOR DETAILED ANALYSIS", product_list(source))
+        product_df = product_daily_series(source, product)
+        
+        # Weekly / monthly totals
+        rollup_section(source, product)
+        
+        # Run forecast
+        results = fit_forecast(product_df, product_stats(source, product))
+        
+        # --- Metrics Dashboard ---
+        st.subheader("📊 Sales Performance Metrics")
+        m1, m2, m3, m4 = st.columns(4)
+        
+        # Historical Daily
+        m1.markdown(f"""
+        <div class="metric-box">
+            <h3>Historical Daily Average</h3>
+            <h2>{results['hist_avg']} units</h2>
+            <div class="variation">± {results['hist_std']} units variation</div>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Historical Monthly
+        m2.markdown(f"""
+        <div class="metric-box">
+            <h3>Historical Monthly Average</h3>
+            <h2>{round(results['hist_avg'] * 30)} units</h2>
+            <div class="variation">± {round(results['hist_std'] * 30)} units variation</div>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Projected Daily
+        m3.markdown(f"""
+        <div class="metric-box">
+            <h3>Projected Daily Average</h3>
+            <h2>{results['forecast_avg']} units</h2>
+            <div class="variation">± {results['forecast_std']} units expected</div>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Projected Monthly
+        m4.markdown(f"""
+        <div class="metric-box">
+            <h3>Projected Monthly Average</h3>
+            <h2>{round(results['forecast_avg'] * 30)} units</h2>
+            <div class="variation">± {round(results['forecast_std'] * 30)} units expected</div>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # --- Forecast Visualization ---
+        st.plotly_chart(
+            create_forecast_chart(product_df, results['forecast']),
+            use_container_width=True
+        )
+        
+        inventory_status_section(results)
+
+@st.fragment
+def inventory_status_section(results):
+    with timed("Inventory status"):
+        st.subheader("🛒 Inventory Status")
+        
+        # Inventory controls
+        with st.expander("⚙️ INVENTORY SETTINGS", expanded=True):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                current_stock = st.number_input("CURRENT STOCK (UNITS)", min_value=0, value=500)
+            with col2:
+                safety_stock = st.number_input("SAFETY STOCK (UNITS)", min_value=0, value=20)
+            with col3:
+                lead_time = st.number_input("LEAD TIME (DAYS)", min_value=1, value=7)
+        
+        plan = plan_inventory(results, current_stock, safety_stock, lead_time)
+        
+        # --- Inventory Alerts ---
+        if current_stock <= plan['reorder_point']:
+            st.error(f"""
+            🚨 **URGENT REORDER NEEDED**  
+            - Suggested Quantity: **{plan['order_qty']} units**  
+            - Stockout in: **~{plan['days_remaining']:.0f} days**  
+            - Projected Stockout Date: **{plan['stockout_date']}**
+            """)
+        else:
+            st.success(f"""
+            ✅ **INVENTORY HEALTHY**  
+            - Reorder Point: **{plan['reorder_point']} units**  
+            - Current Stock Lasts: **{plan['days_remaining'] + lead_time:.0f} days**  
+            - Suggested Order Date: **{(datetime.now() + timedelta(days=plan['days_remaining'])).strftime('%b %d')}**
+            """)
+
 # --- Main App ---
-uploaded_file = st.file_uploader("📤 Upload Sales CSV", type=["csv"])
+if SALES_DATA_PATH:
+    sales_file = SALES_DATA_PATH
+    st.caption(f"📁 Sales history: {SALES_DATA_PATH}")
+else:
+    sales_file = st.file_uploader("📤 Upload Sales CSV", type=["csv"])
 
-if uploaded_file:
-    df = load_data(uploaded_file)
-    
-    # --- Tile Heatmap Section ---
-    st.subheader("🧱 Sales Volume Heatmap")
-    st.markdown("""
-    <div style="margin-bottom: 20px;">
-        <small>Tile size and color represent sales volume (larger/green = better sales)</small>
-    </div>
-    """, unsafe_allow_html=True)
-    heatmap_fig = create_tile_heatmap(df)
-    st.plotly_chart(heatmap_fig, use_container_width=True)
-    
-    # --- Product Selection ---
-    product = st.selectbox("SELECT PRODUCT FOR DETAILED ANALYSIS", df['product'].unique())
-    product_df = df[df['product'] == product]
-    
-    # Inventory controls
-    with st.expander("⚙️ INVENTORY SETTINGS", expanded=True):
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            current_stock = st.number_input("CURRENT STOCK (UNITS)", min_value=0, value=500)
-        with col2:
-            safety_stock = st.number_input("SAFETY STOCK (UNITS)", min_value=0, value=20)
-        with col3:
-            lead_time = st.number_input("LEAD TIME (DAYS)", min_value=1, value=7)
-    
-    # Run forecast
-    results = run_forecast(product_df, current_stock, safety_stock, lead_time)
+if sales_file:
+    source = load_source(sales_file)
     
-    # --- Metrics Dashboard ---
-    st.subheader("📊 Sales Performance Metrics")
-    m1, m2, m3, m4 = st.columns(4)
-    
-    # Historical Daily
-    m1.markdown(f"""
-    <div class="metric-box">
-        <h3>Historical Daily Average</h3>
-        <h2>{results['hist_avg']} units</h2>
-        <div class="variation">± {results['hist_std']} units variation</div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Historical Monthly
-    m2.markdown(f"""
-    <div class="metric-box">
-        <h3>Historical Monthly Average</h3>
-        <h2>{round(results['hist_avg'] * 30)} units</h2>
-        <div class="variation">± {round(results['hist_std'] * 30)} units variation</div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Projected Daily
-    m3.markdown(f"""
-    <div class="metric-box">
-        <h3>Projected Daily Average</h3>
-        <h2>{results['forecast_avg']} units</h2>
-        <div class="variation">± {results['forecast_std']} units expected</div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Projected Monthly
-    m4.markdown(f"""
-    <div class="metric-box">
-        <h3>Projected Monthly Average</h3>
-        <h2>{round(results['forecast_avg'] * 30)} units</h2>
-        <div class="variation">± {round(results['forecast_std'] * 30)} units expected</div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # --- Forecast Visualization ---
-    st.plotly_chart(
-        create_forecast_chart(product_df, results['forecast']),
-        use_container_width=True
-    )
-    
-    # --- Inventory Alerts ---
-    st.subheader("🛒 Inventory Status")
-    if current_stock <= results['reorder_point']:
-        st.error(f"""
-        🚨 **URGENT REORDER NEEDED**  
-        - Suggested Quantity: **{results['order_qty']} units**  
-        - Stockout in: **~{results['days_remaining']:.0f} days**  
-        - Projected Stockout Date: **{results['stockout_date']}**
-        """)
-    else:
-        st.success(f"""
-        ✅ **INVENTORY HEALTHY**  
-        - Reorder Point: **{results['reorder_point']} units**  
-        - Current Stock Lasts: **{results['days_remaining'] + lead_time:.0f} days**  
-        - Suggested Order Date: **{(datetime.now() + timedelta(days=results['days_remaining'])).strftime('%b %d')}**
-        """)
+    heatmap_section(source)
+    product_analysis_section(source)
 
 else:
     st.info("ℹ️ Please upload a CSV file with columns: date, units_sold, product")
@@ -315,3 +574,6 @@ else:
             file_name="sample_sales_data.csv",
             mime="text/csv"
         )
+
+if SHOW_TIMINGS:
+    st.caption(f"⏱️ Full page: {(time.perf_counter() - PAGE_START) * 1000:.0f} ms")